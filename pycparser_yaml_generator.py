@@ -9,20 +9,109 @@ Highly flexible and configurable
 import os
 import sys
 import re
-import yaml
+import pickle
+import hashlib
 import argparse
-from typing import Dict, List, Tuple, Optional, Any, Set, Union as TypingUnion
+from typing import Callable, Dict, List, Tuple, Optional, Any, Set, Union as TypingUnion
 from dataclasses import dataclass, field, asdict
 from datetime import datetime
 from pycparser import c_parser, c_ast, parse_file
+from pycparser import __version__ as _PYCPARSER_VERSION
 from pycparser.c_ast import (
     Typedef, Decl, Struct, Union, Enum as EnumNode, 
     TypeDecl, IdentifierType, PtrDecl, ArrayDecl, 
     Constant, BinaryOp, UnaryOp, FuncDecl
 )
 
+_YamlDumper = None
 
-@dataclass
+
+def _get_yaml_dumper():
+    """Import PyYAML on first use and return its fastest safe dumper"""
+    global _YamlDumper
+    if _YamlDumper is None:
+        # Prefer the LibYAML-backed dumper when PyYAML was built with it
+        try:
+            from yaml import CSafeDumper as _YamlDumper
+        except ImportError:
+            from yaml import SafeDumper as _YamlDumper
+    return _YamlDumper
+
+
+# Precompiled regular expressions used during preprocessing
+_RE_INCLUDE = re.compile(r'#include\s*"([^"]+)"')
+_RE_COMMENTS = re.compile(r'/\*[\s\S]*?\*/|//[^\n]*')
+_RE_PRAGMA_PACK = re.compile(r'#pragma\s+pack\s*\(\s*(\d+)\s*\)')
+_RE_PP_LINE = re.compile(r'^[ \t]*#[^\n]*', re.MULTILINE)
+# Any preprocessing line except numeric macro definitions (#define NAME 123)
+_RE_PP_LINE_NON_NUMERIC = re.compile(r'^[ \t]*#(?!define[ \t]+\w+[ \t]+\d)[^\n]*', re.MULTILINE)
+_RE_DEFINE_NAME = re.compile(r'#define[^\S\n]+(\w+)')
+_RE_PP_CONDITIONAL = re.compile(
+    r'^[ \t]*#(?:(if|ifdef|ifndef|elif) |(else|endif))([^\n]*)', re.MULTILINE)
+_RE_DEFINE = re.compile(r'#define\s+(\w+)(?:\s+(.*))?$')
+_RE_DEFINED_CALL = re.compile(r'defined\s*\(\s*(\w+)\s*\)')
+_RE_IDENT = re.compile(r'\b[a-zA-Z_]\w*\b')
+_RE_SAFE_EXPR = re.compile(r'^[0-9+\-*/()&|!<>=\s]+$')
+_RE_MACRO_EXPR = re.compile(r'^[\d+\-*/().\w\s]+$')
+_RE_ARITH_EXPR = re.compile(r'^[\d+\-*/.\s]+$')
+
+# Declaration type shapes (node classes, outermost first) that define a
+# struct/union inline, mapped to (kind, depth of the struct/union node)
+_NoneType = type(None)
+_INLINE_AGGREGATE_SHAPES = {}
+for _kind, _node_class in (('struct', Struct), ('union', Union)):
+    _INLINE_AGGREGATE_SHAPES.update({
+        (_node_class, _NoneType, _NoneType): (_kind, 0),
+        (TypeDecl, _node_class, _NoneType): (_kind, 1),
+        (ArrayDecl, TypeDecl, _node_class): (_kind, 2),
+    })
+del _kind, _node_class
+
+# Number of most recently used pickled ASTs kept in the cache directory
+_AST_CACHE_MAX_ENTRIES = 32
+
+# Natural alignment (bits) of types up to 64 bits, indexed by size in bits
+_ALIGNMENT_BY_SIZE = tuple(
+    8 if bits <= 8 else 16 if bits <= 16 else 32 if bits <= 32 else 64
+    for bits in range(65)
+)
+
+
+def _parse_int_literal(value: str) -> int:
+    """Parse a C integer literal (decimal, 0x hex or leading-zero octal)"""
+    # int(value, 0) rejects C-style octal such as 0123
+    if value[:1] == '0' and value[1:2].isdigit():
+        return int(value, 8)
+    return int(value, 0)
+
+
+def _ast_cache_dir() -> str:
+    """Directory for pickled ASTs: $XDG_CACHE_HOME/cstruct2yaml, else ~/.cache/cstruct2yaml"""
+    base = os.environ.get('XDG_CACHE_HOME', '')
+    if not os.path.isabs(base):
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'cstruct2yaml')
+
+
+def _prune_ast_cache(cache_dir: str) -> None:
+    """Delete all but the most recently used pickled ASTs"""
+    try:
+        entries = [entry for entry in os.scandir(cache_dir) if entry.name.endswith('.pkl')]
+        if len(entries) <= _AST_CACHE_MAX_ENTRIES:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in entries[_AST_CACHE_MAX_ENTRIES:]:
+            os.unlink(entry.path)
+    except OSError:
+        # Another run may be pruning the same directory
+        pass
+
+
+# Slotted dataclasses (no per-instance __dict__) where supported (Python 3.10+)
+_DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class ConfigOptions:
     """Configuration options"""
     pack_alignment: int = 8  # bits, default 1-byte alignment
@@ -34,11 +123,13 @@ class ConfigOptions:
     output_format: str = "yaml"     # output format: yaml, json
     bit_precision: bool = True      # use bit precision
     verbose: bool = False           # verbose output
+    dump_preprocessed: bool = False # write preprocessed content to preprocessed_debug.h
+    ast_cache: bool = False         # reuse parsed ASTs cached under $XDG_CACHE_HOME/cstruct2yaml
 
 
-@dataclass
+@dataclass(frozen=True, **_DATACLASS_SLOTS)
 class TypeInfo:
-    """Type information"""
+    """Type information (immutable, basic types are shared between fields)"""
     name: str
     size_bits: int
     is_signed: bool = True
@@ -52,7 +143,7 @@ class TypeInfo:
     array_dimensions: List[int] = field(default_factory=list)
     
     
-@dataclass
+@dataclass(**_DATACLASS_SLOTS)
 class FieldInfo:
     """Field information"""
     name: str
@@ -68,58 +159,91 @@ class FieldInfo:
     
     def to_dict(self, config: ConfigOptions) -> Dict[str, Any]:
         """Convert to dictionary"""
-        # Generate C# style array type name if it's an array
-        type_name = self.type_info.name
-        if self.type_info.is_array and self.type_info.array_dimensions:
-            # Build C# style array syntax: baseType[dim1][dim2]...
-            for dimension in self.type_info.array_dimensions:
-                type_name += f"[{dimension}]"
-        
-        result = {
-            'name': self.name,
-            'type': type_name,
-            'size_bits': self.size_bits
-        }
-        
-        if config.include_offsets:
-            result['offset_bits'] = self.offset_bits
-            if config.bit_precision:
-                result['offset_bytes'] = self.offset_bits // 8
-                result['offset_bit_in_byte'] = self.offset_bits % 8
-                result['size_bytes'] = self.size_bits // 8
-                result['size_bit_remainder'] = self.size_bits % 8
-        
-        if config.include_bitfields and self.is_bitfield:
-            result['is_bitfield'] = True
-            result['bit_width'] = self.bit_width
-            if self.bit_offset is not None:
-                result['bit_offset'] = self.bit_offset
-        
-        if config.include_anonymous and self.is_anonymous:
-            result['is_anonymous'] = True
-            
-        if self.type_info.is_array:
-            result['is_array'] = True
-            result['array_dimensions'] = self.type_info.array_dimensions
-            
-        if self.type_info.is_pointer:
-            result['is_pointer'] = True
-            result['base_type'] = self.type_info.base_type
+        return FieldInfo.make_emitter(config)(self)
+    
+    @classmethod
+    def make_emitter(cls, config: ConfigOptions) -> Callable[['FieldInfo'], Dict[str, Any]]:
+        """Build a field-to-dictionary converter specialized for the given options"""
+        # Read the options once instead of once per field
+        include_offsets = config.include_offsets
+        bit_precision = config.include_offsets and config.bit_precision
+        include_bitfields = config.include_bitfields
+        include_anonymous = config.include_anonymous
+        include_children = config.include_children
+        
+        def emit(field_info: 'FieldInfo') -> Dict[str, Any]:
+            type_info = field_info.type_info
             
-        if self.type_info.is_struct:
-            result['is_struct'] = True
-        elif self.type_info.is_union:
-            result['is_union'] = True
-        elif self.type_info.is_enum:
-            result['is_enum'] = True
+            # Generate C# style array type name if it's an array
+            type_name = type_info.name
+            if type_info.is_array and type_info.array_dimensions:
+                # Build C# style array syntax: baseType[dim1][dim2]...
+                type_name += ''.join(f"[{dimension}]" for dimension in type_info.array_dimensions)
             
-        if self.description:
-            result['description'] = self.description
+            # Always-present keys are built in a single dict literal
+            offset_bits = field_info.offset_bits
+            size_bits = field_info.size_bits
+            if bit_precision:
+                offset_bytes, offset_bit_in_byte = divmod(offset_bits, 8)
+                size_bytes, size_bit_remainder = divmod(size_bits, 8)
+                result = {
+                    'name': field_info.name,
+                    'type': type_name,
+                    'size_bits': size_bits,
+                    'offset_bits': offset_bits,
+                    'offset_bytes': offset_bytes,
+                    'offset_bit_in_byte': offset_bit_in_byte,
+                    'size_bytes': size_bytes,
+                    'size_bit_remainder': size_bit_remainder
+                }
+            elif include_offsets:
+                result = {
+                    'name': field_info.name,
+                    'type': type_name,
+                    'size_bits': size_bits,
+                    'offset_bits': offset_bits
+                }
+            else:
+                result = {
+                    'name': field_info.name,
+                    'type': type_name,
+                    'size_bits': size_bits
+                }
             
-        if config.include_children and self.children:
-            result['members'] = [child.to_dict(config) for child in self.children]
+            if include_bitfields and field_info.is_bitfield:
+                result['is_bitfield'] = True
+                result['bit_width'] = field_info.bit_width
+                if field_info.bit_offset is not None:
+                    result['bit_offset'] = field_info.bit_offset
             
-        return result
+            if include_anonymous and field_info.is_anonymous:
+                result['is_anonymous'] = True
+                
+            if type_info.is_array:
+                result['is_array'] = True
+                # Copy, so fields shared between layouts don't become YAML aliases
+                result['array_dimensions'] = list(type_info.array_dimensions)
+                
+            if type_info.is_pointer:
+                result['is_pointer'] = True
+                result['base_type'] = type_info.base_type
+                
+            if type_info.is_struct:
+                result['is_struct'] = True
+            elif type_info.is_union:
+                result['is_union'] = True
+            elif type_info.is_enum:
+                result['is_enum'] = True
+                
+            if field_info.description:
+                result['description'] = field_info.description
+                
+            if include_children and field_info.children:
+                result['members'] = [emit(child) for child in field_info.children]
+                
+            return result
+        
+        return emit
 
 
 class PycparserYamlGenerator:
@@ -143,37 +267,98 @@ class PycparserYamlGenerator:
             'wchar_t': 16, 'char16_t': 16, 'char32_t': 32
         }
         
+        # Type analysis handlers keyed by exact AST node class
+        # (pycparser node classes are never subclassed here)
+        self._type_dispatch = {
+            TypeDecl: self._analyze_type_decl,
+            PtrDecl: self._analyze_ptr_decl,
+            ArrayDecl: self._analyze_array_decl,
+            FuncDecl: self._analyze_func_decl,
+            Struct: self._analyze_inline_struct,
+            Union: self._analyze_inline_union,
+        }
+        self._type_decl_dispatch = {
+            IdentifierType: self._analyze_identifier_type,
+            Struct: self._analyze_struct_ref,
+            Union: self._analyze_union_ref,
+            EnumNode: self._analyze_enum_ref,
+        }
+        
         # Type definition cache
         self.typedefs: Dict[str, Any] = {}
         self.structs: Dict[str, Any] = {}
         self.unions: Dict[str, Any] = {}
         self.enums: Dict[str, Any] = {}
         
+        # Type name -> ('struct' | 'union', node) to expand members from
+        self._type_resolver: Dict[str, Tuple[str, Any]] = {}
+        
+        # Fully expanded file contents keyed by real path (per parse_file call)
+        self._file_cache: Dict[str, str] = {}
+        
+        # Results of #if/#elif expressions keyed by the substituted expression (per parse_file call)
+        self._condition_cache: Dict[str, bool] = {}
+        
+        # Integer values of macro expressions keyed by the substituted expression (per parse_file call)
+        self._expr_cache: Dict[str, int] = {}
+        
+        # Compiled whole-word patterns keyed by macro name (per parse_file call)
+        self._macro_patterns: Dict[str, re.Pattern] = {}
+        
         # Parse state
         self.current_offset = 0
         self.current_bit_offset = 0
+        self._generation_timestamp = ""
+        
+        # Shared TypeInfo instances: identifier types keyed by type name,
+        # pointers by ('ptr', base type name), functions by ('function',)
+        self._typeinfo_intern: Dict[Any, TypeInfo] = {}
+        
+        # Member layouts of struct/union nodes keyed by node identity
+        self._layout_cache: Dict[int, Tuple[List[FieldInfo], int]] = {}
+        
+        # Analyzed types keyed by type node identity, sizes keyed by type name
+        # and struct/union sizes keyed by node identity
+        self._type_cache: Dict[int, Tuple[TypeInfo, int]] = {}
+        self._size_cache: Dict[str, int] = {}
+        self._node_size_cache: Dict[int, int] = {}
         
     def parse_file(self, filename: str, target_struct: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """Parse C header file"""
+        # One timestamp for the whole run
+        self._generation_timestamp = datetime.now().isoformat()
+        
         try:
             if self.config.verbose:
                 print(f"Parsing file: {filename}")
                 
-            # Preprocess file
+            # Preprocess file; headers may have changed since the previous call
+            self._file_cache.clear()
+            self._condition_cache.clear()
+            self._expr_cache.clear()
+            self._macro_patterns.clear()
             preprocessed_content = self._preprocess_file(filename)
             
             # Parse AST
-            parser = c_parser.CParser()
-            ast = parser.parse(preprocessed_content, filename=filename)
+            ast = self._parse_preprocessed(preprocessed_content, filename)
             
             # Store AST for constant resolution
             self.ast = ast
             
+            # Layouts and types are keyed by node identity, so drop those of any previous AST
+            self._layout_cache.clear()
+            self._type_cache.clear()
+            self._size_cache.clear()
+            self._node_size_cache.clear()
+            # Interned types carry sizes and struct/union flags of the previous AST
+            self._typeinfo_intern.clear()
+            
             if self.config.verbose:
                 print("AST parsing successful, starting type definition analysis...")
                 
             # Collect all type definitions
             self._collect_types(ast)
+            self._build_type_resolver()
             
             if self.config.verbose:
                 print(f"Found {len(self.structs)} structs, {len(self.unions)} unions, {len(self.typedefs)} typedefs")
@@ -192,6 +377,54 @@ class PycparserYamlGenerator:
                 traceback.print_exc()
             return None
     
+    def _parse_preprocessed(self, content: str, filename: str) -> c_ast.FileAST:
+        """Parse preprocessed content, reusing a pickled AST from an earlier run"""
+        if not self.config.ast_cache:
+            return c_parser.CParser().parse(content, filename=filename)
+        
+        # Keyed by the preprocessed text, so edits to included files and macro
+        # values invalidate the entry; the filename ends up in node coordinates
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{_PYCPARSER_VERSION}|{os.path.abspath(filename)}|".encode('utf-8'))
+        digest.update(content.encode('utf-8'))
+        cache_dir = _ast_cache_dir()
+        cache_path = os.path.join(cache_dir, digest.hexdigest() + '.pkl')
+        
+        try:
+            with open(cache_path, 'rb') as f:
+                ast = pickle.load(f)
+            # Mark as recently used so pruning keeps it
+            try:
+                os.utime(cache_path)
+            except OSError:
+                pass
+            if self.config.verbose:
+                print(f"Loaded cached AST: {cache_path}")
+            return ast
+        except Exception:
+            pass
+        
+        ast = c_parser.CParser().parse(content, filename=filename)
+        
+        # Write to a temporary file first so concurrent runs never read a partial pickle
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(ast, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+            _prune_ast_cache(cache_dir)
+        except Exception as e:
+            # e.g. RecursionError on very deep expressions; don't leave the partial file behind
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            if self.config.verbose:
+                print(f"Warning: could not write AST cache: {e}")
+        
+        return ast
+    
     def _preprocess_file(self, filename: str) -> str:
         """Preprocess file content"""
         content = self._read_file_recursive(filename)
@@ -211,63 +444,60 @@ class PycparserYamlGenerator:
         # Final cleanup to ensure no remaining preprocessing directives
         content = self._final_cleanup(content)
         
-        if self.config.verbose:
+        if self.config.dump_preprocessed:
             # Save preprocessed content for debugging
             with open('preprocessed_debug.h', 'w', encoding='utf-8') as f:
                 f.write(content)
-            print("Preprocessed content saved to preprocessed_debug.h")
+            if self.config.verbose:
+                print("Preprocessed content saved to preprocessed_debug.h")
         
         return content
     
     def _final_cleanup(self, content: str) -> str:
         """Final cleanup, remove all remaining preprocessing directives"""
-        lines = content.split('\n')
-        cleaned_lines = []
-        
-        for line in lines:
-            line_stripped = line.strip()
-            # If it's a preprocessing directive line, skip completely
-            if line_stripped.startswith('#'):
-                continue
-            # Keep all other content
-            cleaned_lines.append(line)
-        
-        return '\n'.join(cleaned_lines)
+        return _RE_PP_LINE.sub('', content)
     
     def _read_file_recursive(self, filename: str) -> str:
         """Recursively read file, handling includes"""
         if not os.path.exists(filename):
             return ""
+        
+        real_path = os.path.realpath(filename)
+        cached = self._file_cache.get(real_path)
+        if cached is not None:
+            return cached
             
         with open(filename, 'r', encoding='utf-8', errors='ignore') as f:
             content = f.read()
         
         # Handle local includes
         base_dir = os.path.dirname(filename)
-        include_pattern = r'#include\s*"([^"]+)"'
-        
-        def replace_include(match):
+        parts = []
+        last_end = 0
+        for match in _RE_INCLUDE.finditer(content):
+            parts.append(content[last_end:match.start()])
             include_file = match.group(1)
             include_path = os.path.join(base_dir, include_file)
             if os.path.exists(include_path):
-                return self._read_file_recursive(include_path)
-            return f"// Include not found: {include_file}\n"
+                parts.append(self._read_file_recursive(include_path))
+            else:
+                parts.append(f"// Include not found: {include_file}\n")
+            last_end = match.end()
+        parts.append(content[last_end:])
         
-        content = re.sub(include_pattern, replace_include, content)
+        content = ''.join(parts)
+        self._file_cache[real_path] = content
         return content
     
     def _remove_comments(self, content: str) -> str:
         """Remove C-style comments"""
-        # Remove multi-line comments first to handle nested // inside /* */
-        content = re.sub(r'/\*.*?\*/', '', content, flags=re.DOTALL)
-        # Then remove single-line comments
-        content = re.sub(r'//.*?$', '', content, flags=re.MULTILINE)
-        return content
+        # Single pass: whichever comment starts first wins, so // inside /* */
+        # and /* after // are both handled
+        return _RE_COMMENTS.sub('', content)
     
     def _extract_pragma_pack(self, content: str) -> None:
         """Extract pragma pack information"""
-        pack_pattern = r'#pragma\s+pack\s*\(\s*(\d+)\s*\)'
-        matches = re.findall(pack_pattern, content)
+        matches = _RE_PRAGMA_PACK.findall(content)
         if matches:
             self.config.pack_alignment = int(matches[-1]) * 8  # Convert to bits
             if self.config.verbose:
@@ -278,116 +508,84 @@ class PycparserYamlGenerator:
         # First handle conditional compilation
         content = self._process_conditional_compilation(content)
         
-        lines = content.split('\n')
-        processed_lines = []
-        
-        for line in lines:
-            line_stripped = line.strip()
-            if line_stripped.startswith('#'):
-                # Keep numeric macro definitions
-                if re.match(r'#define\s+\w+\s+\d+', line_stripped):
-                    processed_lines.append(line)
-                # Remove other preprocessing directives, including pragma
-                elif (line_stripped.startswith('#pragma') or 
-                      line_stripped.startswith('#include') or
-                      line_stripped.startswith('#ifndef') or
-                      line_stripped.startswith('#ifdef') or
-                      line_stripped.startswith('#if') or
-                      line_stripped.startswith('#else') or
-                      line_stripped.startswith('#endif') or
-                      line_stripped.startswith('#define') or
-                      line_stripped.startswith('#undef')):
-                    # Completely remove these directives
-                    continue
-                else:
-                    # Remove other preprocessing directives as well
-                    continue
-            else:
-                processed_lines.append(line)
-        
-        return '\n'.join(processed_lines)
+        # Keep numeric macro definitions, remove all other directives
+        return _RE_PP_LINE_NON_NUMERIC.sub('', content)
     
     def _process_conditional_compilation(self, content: str) -> str:
         """Process conditional compilation directives like #if, #ifdef, #else, #endif"""
-        lines = content.split('\n')
-        result_lines = []
+        parts = []
+        last_end = 0
         
         # Track conditional compilation state
         condition_stack = []  # Stack of (condition_met, in_else) tuples
         current_condition = True  # Whether current block should be included
         
         # Extract defined macros for ifdef/ifndef evaluation
-        defined_macros = set()
-        macro_pattern = r'#define\s+(\w+)'
-        for line in lines:
-            # Use search instead of match to handle lines with leading whitespace
-            match = re.search(macro_pattern, line.strip())
-            if match:
-                macro_name = match.group(1)
-                defined_macros.add(macro_name)
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            line_stripped = line.strip()
+        defined_macros = set(_RE_DEFINE_NAME.findall(content))
+        # One alternation matching any defined macro name, shared by all #if/#elif
+        defined_pattern = None
+        if defined_macros:
+            defined_pattern = re.compile(
+                r'\b(?:' + '|'.join(map(re.escape, defined_macros)) + r')\b')
+        
+        for match in _RE_PP_CONDITIONAL.finditer(content):
+            # Regular lines before this directive - include them if current condition is true
+            if current_condition:
+                parts.append(content[last_end:match.start()])
+            last_end = match.end()
+            
+            directive = match.group(1) or match.group(2)
+            argument = match.group(3).strip()
             
-            if line_stripped.startswith('#if '):
+            if directive == 'if':
                 # Parse #if condition
-                condition_expr = line_stripped[4:].strip()
-                condition_met = self._evaluate_condition(condition_expr, defined_macros)
+                condition_met = self._evaluate_condition(argument, defined_macros, defined_pattern)
                 condition_stack.append((current_condition, False))
                 current_condition = current_condition and condition_met
                 
-            elif line_stripped.startswith('#ifdef '):
+            elif directive == 'ifdef':
                 # Check if macro is defined
-                macro_name = line_stripped[7:].strip()
-                condition_met = macro_name in defined_macros
+                condition_met = argument in defined_macros
                 condition_stack.append((current_condition, False))
                 current_condition = current_condition and condition_met
                 
-            elif line_stripped.startswith('#ifndef '):
+            elif directive == 'ifndef':
                 # Check if macro is NOT defined - but for header guards, assume they should be included
-                macro_name = line_stripped[8:].strip()
                 # Skip header guard patterns (simple heuristic: macro name ends with _H)
-                if macro_name.endswith('_H'):
+                if argument.endswith('_H'):
                     # Assume this is a header guard, skip the #ifndef and include content
                     condition_stack.append((current_condition, False))
-                    current_condition = current_condition  # Don't change condition for header guards
                 else:
-                    condition_met = macro_name not in defined_macros
+                    condition_met = argument not in defined_macros
                     condition_stack.append((current_condition, False))
                     current_condition = current_condition and condition_met
                 
-            elif line_stripped.startswith('#else'):
+            elif directive == 'else':
                 if condition_stack:
                     parent_condition, _ = condition_stack[-1]
                     condition_stack[-1] = (parent_condition, True)
                     # Flip the current condition within the parent scope
                     current_condition = parent_condition and not current_condition
                     
-            elif line_stripped.startswith('#elif '):
+            elif directive == 'elif':
                 # Treat #elif as #else followed by #if
                 if condition_stack:
                     parent_condition, in_else = condition_stack[-1]
                     if not in_else:  # Only process #elif if we haven't seen #else yet
-                        condition_expr = line_stripped[6:].strip()
-                        condition_met = self._evaluate_condition(condition_expr, defined_macros)
+                        condition_met = self._evaluate_condition(argument, defined_macros, defined_pattern)
                         current_condition = parent_condition and (not current_condition) and condition_met
                         
-            elif line_stripped.startswith('#endif'):
+            else:  # endif
                 if condition_stack:
                     current_condition, _ = condition_stack.pop()
-                    
-            else:
-                # Regular line - include it if current condition is true
-                if current_condition:
-                    result_lines.append(line)
-            
-            i += 1
         
-        return '\n'.join(result_lines)
+        if current_condition:
+            parts.append(content[last_end:])
+        
+        return ''.join(parts)
     
-    def _evaluate_condition(self, condition: str, defined_macros: set) -> bool:
+    def _evaluate_condition(self, condition: str, defined_macros: set,
+                            defined_pattern: Optional[re.Pattern] = None) -> bool:
         """Evaluate a preprocessor condition like '0', '1', 'defined(MACRO)', etc."""
         condition = condition.strip()
         
@@ -398,33 +596,38 @@ class PycparserYamlGenerator:
             return True
         
         # Handle defined() expressions
-        defined_pattern = r'defined\s*\(\s*(\w+)\s*\)'
-        condition = re.sub(defined_pattern, 
-                          lambda m: '1' if m.group(1) in defined_macros else '0', 
-                          condition)
+        condition = _RE_DEFINED_CALL.sub(
+            lambda m: '1' if m.group(1) in defined_macros else '0', condition)
         
         # Replace macro names with 1 if defined, 0 if not
-        for macro in defined_macros:
-            condition = re.sub(r'\b' + re.escape(macro) + r'\b', '1', condition)
+        if defined_pattern is not None:
+            condition = defined_pattern.sub('1', condition)
         
         # Replace any remaining unknown identifiers with 0
-        condition = re.sub(r'\b[a-zA-Z_]\w*\b', '0', condition)
+        condition = _RE_IDENT.sub('0', condition)
+        
+        # Reuse the result of an identical, already evaluated expression
+        cached = self._condition_cache.get(condition)
+        if cached is not None:
+            return cached
+        
+        # Default to False for complex or unparseable conditions
+        result = False
         
         # Try to evaluate the expression safely
         try:
             # Only allow basic arithmetic and comparison operators
-            if re.match(r'^[0-9+\-*/()&|!<>=\s]+$', condition):
+            if _RE_SAFE_EXPR.match(condition):
                 # Replace C-style operators with Python equivalents
-                condition = condition.replace('&&', ' and ')
-                condition = condition.replace('||', ' or ')
-                condition = condition.replace('!', ' not ')
-                result = eval(condition)
-                return bool(result)
-        except:
+                expr = condition.replace('&&', ' and ')
+                expr = expr.replace('||', ' or ')
+                expr = expr.replace('!', ' not ')
+                result = bool(eval(expr, {'__builtins__': {}}))
+        except Exception:
             pass
         
-        # Default to False for complex or unparseable conditions
-        return False
+        self._condition_cache[condition] = result
+        return result
     
     def _expand_simple_macros(self, content: str) -> str:
         """Expand simple numeric macros, supporting expression calculation"""
@@ -436,7 +639,7 @@ class PycparserYamlGenerator:
         for line in lines:
             line_stripped = line.strip()
             # Match #define directives
-            define_match = re.match(r'#define\s+(\w+)(?:\s+(.*))?$', line_stripped)
+            define_match = _RE_DEFINE.match(line_stripped)
             if define_match:
                 name = define_match.group(1)
                 value = define_match.group(2)
@@ -454,19 +657,23 @@ class PycparserYamlGenerator:
                 if value.isdigit():
                     macros[name] = value
                 # If it's an expression, try to calculate
-                elif re.match(r'^[\d+\-*/().\w\s]+$', value):
+                elif _RE_MACRO_EXPR.match(value):
                     # First replace known macros
                     for known_macro, known_value in macros.items():
                         if known_value:  # Only replace non-empty macros
-                            value = re.sub(r'\b' + re.escape(known_macro) + r'\b', known_value, value)
+                            value = self._macro_pattern(known_macro).sub(known_value, value)
                     
                     try:
                         # Try to evaluate expression
                         # Remove parentheses and calculate
                         clean_value = value.replace('(', '').replace(')', '')
-                        if re.match(r'^[\d+\-*/.\s]+$', clean_value):
-                            result = eval(clean_value)
-                            macros[name] = str(int(result))
+                        if _RE_ARITH_EXPR.match(clean_value):
+                            # Pure arithmetic, so identical expressions are evaluated once
+                            result = self._expr_cache.get(clean_value)
+                            if result is None:
+                                result = int(eval(clean_value))
+                                self._expr_cache[clean_value] = result
+                            macros[name] = str(result)
                         else:
                             macros[name] = value
                     except:
@@ -477,55 +684,111 @@ class PycparserYamlGenerator:
                 if self.config.verbose:
                     print(f"Found macro definition: {name} = {value if value else '(empty)'} -> {macros[name]}")
         
-        # Multiple rounds of replacement to ensure nested macros are properly expanded
+        # Fully expand nested macros in the values first, then replace all
+        # macro names in a single pass over the content
         # But skip empty macros for expansion (they should remain as empty)
-        for _ in range(3):  # Maximum 3 rounds of replacement
-            for name, value in macros.items():
-                if value:  # Only expand non-empty macros
-                    content = re.sub(r'\b' + re.escape(name) + r'\b', value, content)
+        expanded = self._resolve_macro_values(macros)
+        if not expanded:
+            return content
         
-        return content
+        names = sorted(expanded, key=len, reverse=True)
+        pattern = re.compile(r'\b(?:' + '|'.join(map(re.escape, names)) + r')\b')
+        return pattern.sub(lambda m: expanded[m.group(0)], content)
     
-    def _collect_types(self, ast: c_ast.FileAST) -> None:
-        """Collect all type definitions"""
-        class TypeCollector(c_ast.NodeVisitor):
-            def __init__(self, generator):
-                self.gen = generator
+    def _resolve_macro_values(self, macros: Dict[str, str]) -> Dict[str, str]:
+        """Expand macro references inside non-empty macro values in dependency order"""
+        resolved: Dict[str, str] = {}
+        in_progress: Set[str] = set()
+        
+        def resolve(name: str) -> str:
+            value = resolved.get(name)
+            if value is not None:
+                return value
             
-            def visit_Typedef(self, node):
-                self.gen._process_typedef(node)
-                self.generic_visit(node)
+            in_progress.add(name)
             
-            def visit_Struct(self, node):
-                if node.name:
-                    self.gen.structs[node.name] = node
-                self.generic_visit(node)
+            def substitute(match):
+                ident = match.group(0)
+                # Self-referencing (cyclic) macros are left unexpanded
+                if macros.get(ident) and ident not in in_progress:
+                    return resolve(ident)
+                return ident
             
-            def visit_Union(self, node):
+            value = _RE_IDENT.sub(substitute, macros[name])
+            in_progress.discard(name)
+            resolved[name] = value
+            return value
+        
+        for name, value in macros.items():
+            if value:  # Only expand non-empty macros
+                resolve(name)
+        
+        return resolved
+    
+    def _macro_pattern(self, name: str) -> re.Pattern:
+        """Get the compiled whole-word pattern for a macro name"""
+        pattern = self._macro_patterns.get(name)
+        if pattern is None:
+            pattern = re.compile(r'\b' + re.escape(name) + r'\b')
+            self._macro_patterns[name] = pattern
+        return pattern
+    
+    def _collect_types(self, ast: c_ast.FileAST) -> None:
+        """Collect all type definitions"""
+        # Iterative pre-order walk (same visiting order as a NodeVisitor,
+        # so later references to a name still override earlier ones)
+        stack = [ast]
+        while stack:
+            node = stack.pop()
+            node_type = type(node)
+            if node_type is Typedef:
+                self._process_typedef(node)
+            elif node_type is Struct:
                 if node.name:
-                    self.gen.unions[node.name] = node
-                self.generic_visit(node)
-            
-            def visit_Enum(self, node):
+                    self.structs[node.name] = node
+            elif node_type is Union:
                 if node.name:
-                    self.gen.enums[node.name] = node
-                self.generic_visit(node)
+                    self.unions[node.name] = node
+            elif node_type is EnumNode:
+                if node.name:
+                    self.enums[node.name] = node
+            
+            children = node.children()
+            if children:
+                stack.extend(child for _, child in reversed(children))
+    
+    def _build_type_resolver(self) -> None:
+        """Map type names to the struct/union node whose members they expand to"""
+        resolver = {}
+        
+        # Lowest precedence first: typedefs, then unions, then structs
+        for name, typedef_node in self.typedefs.items():
+            if isinstance(typedef_node.type, TypeDecl):
+                if isinstance(typedef_node.type.type, Struct):
+                    resolver[name] = ('struct', typedef_node.type.type)
+                elif isinstance(typedef_node.type.type, Union):
+                    resolver[name] = ('union', typedef_node.type.type)
+        for name, union_node in self.unions.items():
+            resolver[name] = ('union', union_node)
+            resolver[f"union {name}"] = ('union', union_node)
+        for name, struct_node in self.structs.items():
+            resolver[name] = ('struct', struct_node)
+            resolver[f"struct {name}"] = ('struct', struct_node)
         
-        collector = TypeCollector(self)
-        collector.visit(ast)
+        self._type_resolver = resolver
     
-    def _process_typedef(self, typedef: c_ast.Typedef) -> None:
+    def _process_typedef(self, typedef: Typedef) -> None:
         """Process typedef definition"""
         name = typedef.name
         self.typedefs[name] = typedef
         
         # If typedef defines a struct or union, add to corresponding collection
-        if isinstance(typedef.type, c_ast.TypeDecl):
-            if isinstance(typedef.type.type, c_ast.Struct):
+        if isinstance(typedef.type, TypeDecl):
+            if isinstance(typedef.type.type, Struct):
                 self.structs[name] = typedef.type.type
                 if typedef.type.type.name:
                     self.structs[typedef.type.type.name] = typedef.type.type
-            elif isinstance(typedef.type.type, c_ast.Union):
+            elif isinstance(typedef.type.type, Union):
                 self.unions[name] = typedef.type.type
                 if typedef.type.type.name:
                     self.unions[typedef.type.type.name] = typedef.type.type
@@ -545,7 +808,7 @@ class PycparserYamlGenerator:
                 'total_size_bits': field_info.size_bits,
                 'total_size_bytes': field_info.size_bits // 8,
                 'pack_alignment': self.config.pack_alignment,
-                'generated_at': datetime.now().isoformat(),
+                'generated_at': self._generation_timestamp,
                 'generator': 'pycparser_yaml_generator'
             },
             'struct_definition': field_info.to_dict(self.config)
@@ -557,7 +820,7 @@ class PycparserYamlGenerator:
             'structs': {},
             'unions': {},
             'generation_info': {
-                'generated_at': datetime.now().isoformat(),
+                'generated_at': self._generation_timestamp,
                 'generator': 'pycparser_yaml_generator',
                 'pack_alignment': self.config.pack_alignment,
                 'total_structs': len(self.structs),
@@ -565,39 +828,27 @@ class PycparserYamlGenerator:
             }
         }
         
+        emit = FieldInfo.make_emitter(self.config)
+        
         # Analyze all structs
         for name, struct_node in self.structs.items():
             if self.config.verbose:
                 print(f"Analyzing struct: {name}")
             field_info = self._analyze_struct_node(struct_node, name)
-            result['structs'][name] = field_info.to_dict(self.config)
+            result['structs'][name] = emit(field_info)
         
         # Analyze all unions
         for name, union_node in self.unions.items():
             if self.config.verbose:
                 print(f"Analyzing union: {name}")
             field_info = self._analyze_union_node(union_node, name)
-            result['unions'][name] = field_info.to_dict(self.config)
+            result['unions'][name] = emit(field_info)
         
         return result
     
-    def _analyze_struct_node(self, struct_node: c_ast.Struct, name: str) -> FieldInfo:
+    def _analyze_struct_node(self, struct_node: Struct, name: str) -> FieldInfo:
         """Analyze struct node"""
-        self.current_offset = 0
-        self.current_bit_offset = 0
-        
-        children = []
-        if struct_node.decls:
-            for decl in struct_node.decls:
-                field = self._analyze_declaration(decl)
-                if field:
-                    children.append(field)
-        
-        total_size = self.current_offset
-        # Struct alignment
-        alignment = self.config.pack_alignment
-        if total_size % alignment != 0:
-            total_size = ((total_size // alignment) + 1) * alignment
+        children, total_size = self._layout_struct(struct_node)
         
         type_info = TypeInfo(
             name=f"struct {name}",
@@ -613,27 +864,9 @@ class PycparserYamlGenerator:
             children=children
         )
     
-    def _analyze_union_node(self, union_node: c_ast.Union, name: str) -> FieldInfo:
+    def _analyze_union_node(self, union_node: Union, name: str) -> FieldInfo:
         """Analyze union node"""
-        children = []
-        max_size = 0
-        
-        if union_node.decls:
-            for decl in union_node.decls:
-                # Union members all start from offset 0
-                saved_offset = self.current_offset
-                saved_bit_offset = self.current_bit_offset
-                self.current_offset = 0
-                self.current_bit_offset = 0
-                
-                field = self._analyze_declaration(decl)
-                if field:
-                    children.append(field)
-                    max_size = max(max_size, field.size_bits)
-                
-                # Restore offset
-                self.current_offset = saved_offset
-                self.current_bit_offset = saved_bit_offset
+        children, max_size = self._layout_union(union_node)
         
         type_info = TypeInfo(
             name=f"union {name}",
@@ -649,7 +882,7 @@ class PycparserYamlGenerator:
             children=children
         )
     
-    def _analyze_declaration(self, decl: c_ast.Decl) -> Optional[FieldInfo]:
+    def _analyze_declaration(self, decl: Decl) -> Optional[FieldInfo]:
         """Analyze declaration"""
         if not decl.type:
             return None
@@ -664,17 +897,88 @@ class PycparserYamlGenerator:
                 print(f"  Inner type: {type(decl.type.type)}")
         
         # Check bitfield
-        is_bitfield = hasattr(decl, 'bitsize') and decl.bitsize is not None
+        bitsize = getattr(decl, 'bitsize', None)
+        is_bitfield = bitsize is not None
         bit_width = None
         if is_bitfield:
-            bit_width = self._get_constant_value(decl.bitsize)
+            bit_width = self._get_constant_value(bitsize)
         
         # Analyze type
-        type_info, size_bits = self._analyze_type(decl.type)
+        type_info, size_bits = self._analyze_declaration_type(decl, is_anonymous)
+        
+        # Calculate offset
+        (field_offset, bit_offset, actual_size,
+         self.current_offset, self.current_bit_offset) = self._place_field(
+            type_info, size_bits, bit_width, self.current_offset, self.current_bit_offset)
+        
+        # Analyze child members (if it's a struct or union)
+        children = []
+        target = None
+        
+        if not self.config.include_children:
+            # 不输出子成员时无需展开
+            pass
+        elif type_info.is_array and type_info.base_type:
+            # 对于数组，分析其元素类型
+            # 元素类型写作 struct X / union X 时不查名称表，只展开内联定义的结构体
+            if not type_info.base_type.startswith(('struct ', 'union ')):
+                target = self._type_resolver.get(type_info.base_type)
+            if target is None and type_info.is_struct:
+                # 匿名结构体数组，直接展开其成员
+                target = self._inline_aggregate(decl.type)
+        elif type_info.is_struct or type_info.is_union:
+            target = self._type_resolver.get(type_info.name)
+            if target is None:
+                # 匿名结构体/联合体，直接展开其定义
+                target = self._inline_aggregate(decl.type)
+                if target is not None and (target[0] == 'struct') != type_info.is_struct:
+                    target = None
+        
+        if target is not None:
+            kind, node = target
+            if kind == 'struct':
+                children = self._get_struct_children(node)
+            else:
+                children = self._get_union_children(node)
+        
+        return FieldInfo(
+            name=name,
+            type_info=type_info,
+            offset_bits=field_offset,
+            size_bits=actual_size or size_bits,
+            bit_width=bit_width,
+            bit_offset=bit_offset,
+            is_anonymous=is_anonymous,
+            is_bitfield=is_bitfield,
+            children=children
+        )
+    
+    def _inline_aggregate(self, type_node) -> Optional[Tuple[str, Any]]:
+        """Find the struct/union node defined inline in a declaration type"""
+        inner = getattr(type_node, 'type', None)
+        shape = (type(type_node), type(inner), type(getattr(inner, 'type', None)))
+        match = _INLINE_AGGREGATE_SHAPES.get(shape)
+        if match is None:
+            return None
+        kind, depth = match
+        if depth == 0:
+            return kind, type_node
+        if depth == 1:
+            return kind, inner
+        return kind, inner.type
+    
+    def _analyze_declaration_type(self, decl: Decl, is_anonymous: bool) -> Tuple[TypeInfo, int]:
+        """Analyze the type of a member declaration"""
+        type_node = decl.type
+        if type(type_node) is TypeDecl and type(type_node.type) is IdentifierType:
+            # Fast path for basic/typedef members: go straight to the shared TypeInfo
+            return self._analyze_identifier_type(type_node.type)
+        
+        type_info, size_bits = self._analyze_type(type_node)
         
         # Special handling: if it's anonymous and is an inline struct or union definition
-        if is_anonymous and isinstance(decl.type, c_ast.TypeDecl):
-            if isinstance(decl.type.type, c_ast.Struct):
+        if is_anonymous and isinstance(decl.type, TypeDecl):
+            if isinstance(decl.type.type, Struct):
                 # Anonymous struct
                 if self.config.verbose:
                     print(f"  Identified as anonymous struct")
@@ -684,7 +988,7 @@ class PycparserYamlGenerator:
                     is_struct=True
                 )
                 size_bits = type_info.size_bits
-            elif isinstance(decl.type.type, c_ast.Union):
+            elif isinstance(decl.type.type, Union):
                 # Anonymous union
                 if self.config.verbose:
                     print(f"  Identified as anonymous union")
@@ -695,253 +999,195 @@ class PycparserYamlGenerator:
                 )
                 size_bits = type_info.size_bits
         
-        # Calculate offset
-        field_offset = self.current_offset
+        return type_info, size_bits
+    
+    def _place_field(self, type_info: TypeInfo, size_bits: int, bit_width: Optional[int],
+                     offset: int, bit_offset: int) -> Tuple[int, Optional[int], int, int, int]:
+        """Place a field at the given layout position (no side effects)
+        
+        Returns (field_offset, field_bit_offset, actual_size, next_offset, next_bit_offset)
+        """
+        alignment = self._get_type_alignment(type_info)
         
-        if is_bitfield and bit_width is not None:
-            # Bitfield processing
-            if self.current_bit_offset + bit_width <= self._get_type_alignment(type_info):
+        if bit_width is not None:
+            # Bitfield processing, size is just the bit width
+            if bit_offset + bit_width <= alignment:
                 # Can fit in current byte/word
-                bit_offset = self.current_bit_offset
-                self.current_bit_offset += bit_width
-            else:
-                # Need to align to next boundary
-                alignment = self._get_type_alignment(type_info)
-                self.current_offset = ((self.current_offset + alignment - 1) // alignment) * alignment
-                field_offset = self.current_offset
-                bit_offset = 0
-                self.current_bit_offset = bit_width
-            
-            # Bitfield size is just the bit width
-            actual_size = bit_width
-        else:
-            # Normal field alignment
-            alignment = self._get_type_alignment(type_info)
-            aligned_offset = ((self.current_offset + alignment - 1) // alignment) * alignment
-            field_offset = aligned_offset
-            self.current_offset = aligned_offset + size_bits
-            self.current_bit_offset = 0
-            actual_size = size_bits
-            bit_offset = None
+                return offset, bit_offset, bit_width, offset, bit_offset + bit_width
+            # Need to align to next boundary
+            offset = -(-offset // alignment) * alignment
+            return offset, 0, bit_width, offset, bit_width
+        
+        # Normal field alignment
+        aligned_offset = -(-offset // alignment) * alignment
+        return aligned_offset, None, size_bits, aligned_offset + size_bits, 0
+    
+    def _analyze_type(self, type_node) -> Tuple[TypeInfo, int]:
+        """分析类型节点，按节点缓存结果"""
+        key = id(type_node)
+        cached = self._type_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        result = self._analyze_type_node(type_node)
+        self._type_cache[key] = result
+        return result
+    
+    def _analyze_type_node(self, type_node) -> Tuple[TypeInfo, int]:
+        """分析类型节点（不使用缓存）"""
+        handler = self._type_dispatch.get(type(type_node))
+        if handler is None:
+            # 未知类型，默认处理
+            return TypeInfo(name="unknown", size_bits=32), 32
+        return handler(type_node)
+    
+    def _analyze_inline_struct(self, struct_node: Struct) -> Tuple[TypeInfo, int]:
+        """分析直接的结构体节点（匿名结构体）"""
+        struct_name = struct_node.name or "anonymous"
+        size_bits = self._calculate_struct_size(struct_node)
+        return TypeInfo(
+            name=f"struct {struct_name}",
+            size_bits=size_bits,
+            is_struct=True
+        ), size_bits
+    
+    def _analyze_inline_union(self, union_node: Union) -> Tuple[TypeInfo, int]:
+        """分析直接的联合体节点（匿名联合体）"""
+        union_name = union_node.name or "anonymous"
+        size_bits = self._calculate_union_size(union_node)
+        return TypeInfo(
+            name=f"union {union_name}",
+            size_bits=size_bits,
+            is_union=True
+        ), size_bits
+    
+    def _analyze_type_decl(self, type_decl: TypeDecl) -> Tuple[TypeInfo, int]:
+        """分析类型声明"""
+        handler = self._type_decl_dispatch.get(type(type_decl.type))
+        if handler is None:
+            return TypeInfo(name="unknown", size_bits=32), 32
+        return handler(type_decl.type)
+    
+    def _analyze_identifier_type(self, identifier_type: IdentifierType) -> Tuple[TypeInfo, int]:
+        """分析标识符类型（基本类型或typedef）"""
+        type_name = ' '.join(identifier_type.names)
         
-        # Analyze child members (if it's a struct or union)
-        children = []
+        # 同名类型共享同一个TypeInfo实例
+        type_info = self._typeinfo_intern.get(type_name)
+        if type_info is not None:
+            return type_info, type_info.size_bits
         
-        # 对于数组，分析其元素类型
-        if type_info.is_array and type_info.base_type:
-            base_type_name = type_info.base_type
-            
-            # 检查基本类型是否是结构体或联合体
-            if base_type_name in self.structs:
-                children = self._get_struct_children(self.structs[base_type_name])
-            elif base_type_name in self.unions:
-                children = self._get_union_children(self.unions[base_type_name])
-            elif base_type_name in self.typedefs:
-                typedef_node = self.typedefs[base_type_name]
-                if isinstance(typedef_node.type, c_ast.TypeDecl):
-                    if isinstance(typedef_node.type.type, c_ast.Struct):
-                        children = self._get_struct_children(typedef_node.type.type)
-                    elif isinstance(typedef_node.type.type, c_ast.Union):
-                        children = self._get_union_children(typedef_node.type.type)
-            # 对于匿名结构体数组，检查数组类型本身
-            elif type_info.is_struct and isinstance(decl.type, c_ast.ArrayDecl) and isinstance(decl.type.type, c_ast.TypeDecl):
-                if isinstance(decl.type.type.type, c_ast.Struct):
-                    # 匿名结构体数组，直接展开其成员
-                    children = self._get_struct_children(decl.type.type.type)
-                elif isinstance(decl.type.type.type, c_ast.Union):
-                    # 匿名联合体数组，直接展开其成员
-                    children = self._get_union_children(decl.type.type.type)
-        
-        # 如果不是数组，按原来的逻辑处理
-        elif type_info.is_struct:
-            if type_info.name.startswith('struct '):
-                struct_name = type_info.name[7:]  # 移除 "struct " 前缀
-                if struct_name in self.structs:
-                    children = self._get_struct_children(self.structs[struct_name])
-                elif struct_name == "anonymous" and isinstance(decl.type, c_ast.TypeDecl) and isinstance(decl.type.type, c_ast.Struct):
-                    # 处理匿名结构体
-                    children = self._get_struct_children(decl.type.type)
-                elif struct_name == "anonymous" and isinstance(decl.type, c_ast.Struct):
-                    # 直接的匿名结构体
-                    children = self._get_struct_children(decl.type)
-            else:
-                # 检查是否是typedef的结构体
-                if type_info.name in self.structs:
-                    children = self._get_struct_children(self.structs[type_info.name])
-                elif type_info.name in self.typedefs:
-                    typedef_node = self.typedefs[type_info.name]
-                    if isinstance(typedef_node.type, c_ast.TypeDecl) and isinstance(typedef_node.type.type, c_ast.Struct):
-                        children = self._get_struct_children(typedef_node.type.type)
-        elif type_info.is_union:
-            if type_info.name.startswith('union '):
-                union_name = type_info.name[6:]  # 移除 "union " 前缀
-                if union_name in self.unions:
-                    children = self._get_union_children(self.unions[union_name])
-                elif union_name == "anonymous" and isinstance(decl.type, c_ast.TypeDecl) and isinstance(decl.type.type, c_ast.Union):
-                    # 处理匿名联合体
-                    children = self._get_union_children(decl.type.type)
-                elif union_name == "anonymous" and isinstance(decl.type, c_ast.Union):
-                    # 直接的匿名联合体
-                    children = self._get_union_children(decl.type)
-            else:
-                # 检查是否是typedef的联合体
-                if type_info.name in self.unions:
-                    children = self._get_union_children(self.unions[type_info.name])
+        size_bits = self._get_basic_type_size(type_name)
+        is_signed = 'unsigned' not in type_name
         
-        return FieldInfo(
-            name=name,
-            type_info=type_info,
-            offset_bits=field_offset,
-            size_bits=actual_size or size_bits,
-            bit_width=bit_width,
-            bit_offset=bit_offset,
-            is_anonymous=is_anonymous,
-            is_bitfield=is_bitfield,
-            children=children
+        # 检查是否是typedef的结构体或联合体
+        is_struct = False
+        is_union = False
+        if type_name in self.typedefs:
+            typedef_node = self.typedefs[type_name]
+            if isinstance(typedef_node.type, TypeDecl):
+                if isinstance(typedef_node.type.type, Struct):
+                    is_struct = True
+                elif isinstance(typedef_node.type.type, Union):
+                    is_union = True
+        elif type_name in self.structs:
+            is_struct = True
+        elif type_name in self.unions:
+            is_union = True
+        
+        type_info = TypeInfo(
+            name=type_name,
+            size_bits=size_bits,
+            is_signed=is_signed,
+            is_struct=is_struct,
+            is_union=is_union
         )
+        
+        # 结果只取决于类型名，可以共享
+        self._typeinfo_intern[type_name] = type_info
+        
+        return type_info, size_bits
     
-    def _analyze_type(self, type_node) -> Tuple[TypeInfo, int]:
-        """分析类型节点"""
-        if isinstance(type_node, c_ast.TypeDecl):
-            return self._analyze_type_decl(type_node)
-        elif isinstance(type_node, c_ast.PtrDecl):
-            return self._analyze_ptr_decl(type_node)
-        elif isinstance(type_node, c_ast.ArrayDecl):
-            return self._analyze_array_decl(type_node)
-        elif isinstance(type_node, c_ast.FuncDecl):
-            return self._analyze_func_decl(type_node)
-        elif isinstance(type_node, c_ast.Struct):
-            # 直接的结构体节点（匿名结构体）
-            struct_name = type_node.name or "anonymous"
-            size_bits = self._calculate_struct_size(type_node)
-            return TypeInfo(
-                name=f"struct {struct_name}",
-                size_bits=size_bits,
-                is_struct=True
-            ), size_bits
-        elif isinstance(type_node, c_ast.Union):
-            # 直接的联合体节点（匿名联合体）
-            union_name = type_node.name or "anonymous"
-            size_bits = self._calculate_union_size(type_node)
-            return TypeInfo(
-                name=f"union {union_name}",
-                size_bits=size_bits,
-                is_union=True
-            ), size_bits
+    def _analyze_struct_ref(self, struct_node: Struct) -> Tuple[TypeInfo, int]:
+        """分析类型声明中的结构体（内联定义或引用）"""
+        struct_name = struct_node.name or "anonymous"
+        
+        if struct_node.decls:
+            # 内联结构体定义
+            size_bits = self._calculate_struct_size(struct_node)
+        elif struct_name in self.structs:
+            # 引用已定义的结构体
+            size_bits = self._calculate_struct_size(self.structs[struct_name])
         else:
-            # 未知类型，默认处理
-            return TypeInfo(name="unknown", size_bits=32), 32
+            size_bits = 0
+        
+        return TypeInfo(
+            name=f"struct {struct_name}",
+            size_bits=size_bits,
+            is_struct=True
+        ), size_bits
     
-    def _analyze_type_decl(self, type_decl: c_ast.TypeDecl) -> Tuple[TypeInfo, int]:
-        """分析类型声明"""
-        if isinstance(type_decl.type, c_ast.IdentifierType):
-            type_name = ' '.join(type_decl.type.names)
-            size_bits = self._get_basic_type_size(type_name)
-            is_signed = 'unsigned' not in type_name
-            
-            # 检查是否是typedef的结构体或联合体
-            is_struct = False
-            is_union = False
-            if type_name in self.typedefs:
-                typedef_node = self.typedefs[type_name]
-                if isinstance(typedef_node.type, c_ast.TypeDecl):
-                    if isinstance(typedef_node.type.type, c_ast.Struct):
-                        is_struct = True
-                    elif isinstance(typedef_node.type.type, c_ast.Union):
-                        is_union = True
-            elif type_name in self.structs:
-                is_struct = True
-            elif type_name in self.unions:
-                is_union = True
-            
-            return TypeInfo(
-                name=type_name,
-                size_bits=size_bits,
-                is_signed=is_signed,
-                is_struct=is_struct,
-                is_union=is_union
-            ), size_bits
-            
-        elif isinstance(type_decl.type, c_ast.Struct):
-            struct_node = type_decl.type
-            struct_name = struct_node.name or "anonymous"
-            
-            if struct_node.decls:
-                # 内联结构体定义
-                size_bits = self._calculate_struct_size(struct_node)
-            elif struct_name in self.structs:
-                # 引用已定义的结构体
-                size_bits = self._calculate_struct_size(self.structs[struct_name])
-            else:
-                size_bits = 0
-            
-            return TypeInfo(
-                name=f"struct {struct_name}",
-                size_bits=size_bits,
-                is_struct=True
-            ), size_bits
-            
-        elif isinstance(type_decl.type, c_ast.Union):
-            union_node = type_decl.type
-            union_name = union_node.name or "anonymous"
-            
-            if union_node.decls:
-                # 内联联合体定义
-                size_bits = self._calculate_union_size(union_node)
-            elif union_name in self.unions:
-                # 引用已定义的联合体
-                size_bits = self._calculate_union_size(self.unions[union_name])
-            else:
-                size_bits = 0
-            
-            return TypeInfo(
-                name=f"union {union_name}",
-                size_bits=size_bits,
-                is_union=True
-            ), size_bits
-            
-        elif isinstance(type_decl.type, c_ast.Enum):
-            enum_node = type_decl.type
-            enum_name = enum_node.name or "anonymous"
-            
-            return TypeInfo(
-                name=f"enum {enum_name}",
-                size_bits=32,  # 枚举通常是int大小
-                is_enum=True
-            ), 32
+    def _analyze_union_ref(self, union_node: Union) -> Tuple[TypeInfo, int]:
+        """分析类型声明中的联合体（内联定义或引用）"""
+        union_name = union_node.name or "anonymous"
         
+        if union_node.decls:
+            # 内联联合体定义
+            size_bits = self._calculate_union_size(union_node)
+        elif union_name in self.unions:
+            # 引用已定义的联合体
+            size_bits = self._calculate_union_size(self.unions[union_name])
         else:
-            return TypeInfo(name="unknown", size_bits=32), 32
+            size_bits = 0
+        
+        return TypeInfo(
+            name=f"union {union_name}",
+            size_bits=size_bits,
+            is_union=True
+        ), size_bits
     
-    def _analyze_ptr_decl(self, ptr_decl: c_ast.PtrDecl) -> Tuple[TypeInfo, int]:
+    def _analyze_enum_ref(self, enum_node: EnumNode) -> Tuple[TypeInfo, int]:
+        """分析类型声明中的枚举"""
+        enum_name = enum_node.name or "anonymous"
+        
+        return TypeInfo(
+            name=f"enum {enum_name}",
+            size_bits=32,  # 枚举通常是int大小
+            is_enum=True
+        ), 32
+    
+    def _analyze_ptr_decl(self, ptr_decl: PtrDecl) -> Tuple[TypeInfo, int]:
         """分析指针声明"""
         base_type_info, _ = self._analyze_type(ptr_decl.type)
         
-        return TypeInfo(
-            name=f"{base_type_info.name} *",
-            size_bits=self.config.pointer_size,
-            is_pointer=True,
-            base_type=base_type_info.name
-        ), self.config.pointer_size
+        key = ('ptr', base_type_info.name)
+        type_info = self._typeinfo_intern.get(key)
+        if type_info is None:
+            type_info = TypeInfo(
+                name=f"{base_type_info.name} *",
+                size_bits=self.config.pointer_size,
+                is_pointer=True,
+                base_type=base_type_info.name
+            )
+            self._typeinfo_intern[key] = type_info
+        
+        return type_info, self.config.pointer_size
     
-    def _analyze_array_decl(self, array_decl: c_ast.ArrayDecl) -> Tuple[TypeInfo, int]:
+    def _analyze_array_decl(self, array_decl: ArrayDecl) -> Tuple[TypeInfo, int]:
         """分析数组声明"""
-        element_type_info, element_size = self._analyze_type(array_decl.type)
-        
-        # 获取当前维度
-        array_size = 1
-        if array_decl.dim:
-            array_size = self._get_constant_value(array_decl.dim)
-        
-        # 构建维度列表
-        dimensions = [array_size]
-        
-        # 如果元素类型也是数组，合并维度
-        if element_type_info.is_array:
-            dimensions.extend(element_type_info.array_dimensions)
-            total_size = element_size * array_size
-        else:
-            total_size = element_size * array_size
+        # 逐层收集维度（外层在前），最内层元素类型只分析一次
+        dimensions = []
+        node = array_decl
+        while isinstance(node, ArrayDecl):
+            array_size = 1
+            if node.dim:
+                array_size = self._get_constant_value(node.dim)
+            dimensions.append(array_size)
+            node = node.type
+        
+        element_type_info, total_size = self._analyze_type(node)
+        for array_size in dimensions:
+            total_size *= array_size
         
         # 保持元素类型的结构体/联合体标记
         return TypeInfo(
@@ -955,63 +1201,66 @@ class PycparserYamlGenerator:
             is_enum=element_type_info.is_enum       # 保持枚举标记
         ), total_size
     
-    def _analyze_func_decl(self, func_decl: c_ast.FuncDecl) -> Tuple[TypeInfo, int]:
+    def _analyze_func_decl(self, func_decl: FuncDecl) -> Tuple[TypeInfo, int]:
         """分析函数声明"""
-        return TypeInfo(
-            name="function",
-            size_bits=self.config.pointer_size,
-            is_function=True
-        ), self.config.pointer_size
+        key = ('function',)
+        type_info = self._typeinfo_intern.get(key)
+        if type_info is None:
+            type_info = TypeInfo(
+                name="function",
+                size_bits=self.config.pointer_size,
+                is_function=True
+            )
+            self._typeinfo_intern[key] = type_info
+        
+        return type_info, self.config.pointer_size
     
     def _get_basic_type_size(self, type_name: str) -> int:
         """获取基本类型大小"""
         type_name = type_name.strip()
         
-        # 检查类型定义
-        if type_name in self.typedefs:
-            typedef_node = self.typedefs[type_name]
-            _, size = self._analyze_type(typedef_node.type)
+        size = self._size_cache.get(type_name)
+        if size is not None:
             return size
         
-        # 检查是否是已知的结构体类型
-        if type_name in self.structs:
-            return self._calculate_struct_size(self.structs[type_name])
-        
-        # 检查是否是已知的联合体类型
-        if type_name in self.unions:
-            return self._calculate_union_size(self.unions[type_name])
-        
-        # 检查基本类型
-        if type_name in self.basic_types:
-            return self.basic_types[type_name]
-        
-        # 处理修饰符
         base_type = type_name.replace('signed ', '').replace('unsigned ', '')
-        if base_type in self.basic_types:
-            return self.basic_types[base_type]
+        if type_name in self.typedefs:
+            # 检查类型定义
+            _, size = self._analyze_type(self.typedefs[type_name].type)
+        elif type_name in self.structs:
+            # 检查是否是已知的结构体类型
+            size = self._calculate_struct_size(self.structs[type_name])
+        elif type_name in self.unions:
+            # 检查是否是已知的联合体类型
+            size = self._calculate_union_size(self.unions[type_name])
+        elif type_name in self.basic_types:
+            # 检查基本类型
+            size = self.basic_types[type_name]
+        elif base_type in self.basic_types:
+            # 处理修饰符
+            size = self.basic_types[base_type]
+        else:
+            # 默认大小
+            size = 32
         
-        # 默认大小
-        return 32
+        self._size_cache[type_name] = size
+        return size
     
     def _get_type_alignment(self, type_info: TypeInfo) -> int:
-        """获取类型对齐大小"""
+        """获取类型对齐大小（随当前配置计算，不缓存在TypeInfo上）"""
         if type_info.is_pointer:
             return self.config.pointer_size
-        elif type_info.size_bits <= 8:
-            return 8
-        elif type_info.size_bits <= 16:
-            return 16
-        elif type_info.size_bits <= 32:
-            return 32
-        elif type_info.size_bits <= 64:
-            return 64
-        else:
-            return min(self.config.pack_alignment, 64)
+        size_bits = type_info.size_bits
+        if size_bits <= 64:
+            return _ALIGNMENT_BY_SIZE[max(size_bits, 0)]
+        return min(self.config.pack_alignment, 64)
     
-    def _calculate_struct_size(self, struct_node: c_ast.Struct) -> int:
-        """计算结构体大小"""
-        if not struct_node.decls:
-            return 0
+    def _layout_struct(self, struct_node: Struct) -> Tuple[List[FieldInfo], int]:
+        """布局结构体成员，按节点缓存 (子成员, 总大小)"""
+        key = id(struct_node)
+        cached = self._layout_cache.get(key)
+        if cached is not None:
+            return cached
         
         # 保存当前状态
         saved_offset = self.current_offset
@@ -1020,82 +1269,130 @@ class PycparserYamlGenerator:
         self.current_offset = 0
         self.current_bit_offset = 0
         
-        for decl in struct_node.decls:
-            self._analyze_declaration(decl)
+        children = []
+        if struct_node.decls:
+            for decl in struct_node.decls:
+                field = self._analyze_declaration(decl)
+                if field:
+                    children.append(field)
         
-        total_size = self.current_offset
+        total_size = self._pad_struct_size(self.current_offset)
         
-        # 结构体对齐
-        alignment = self.config.pack_alignment
-        if total_size % alignment != 0:
-            total_size = ((total_size // alignment) + 1) * alignment
+        # 恢复状态
+        self.current_offset = saved_offset
+        self.current_bit_offset = saved_bit_offset
+        
+        result = (children, total_size)
+        self._layout_cache[key] = result
+        self._node_size_cache[key] = total_size
+        return result
+    
+    def _layout_union(self, union_node: Union) -> Tuple[List[FieldInfo], int]:
+        """布局联合体成员，按节点缓存 (子成员, 最大成员大小)"""
+        key = id(union_node)
+        cached = self._layout_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        # 保存当前状态
+        saved_offset = self.current_offset
+        saved_bit_offset = self.current_bit_offset
+        
+        children = []
+        max_size = 0
+        if union_node.decls:
+            for decl in union_node.decls:
+                # 联合体成员都从偏移0开始
+                self.current_offset = 0
+                self.current_bit_offset = 0
+                
+                field = self._analyze_declaration(decl)
+                if field:
+                    children.append(field)
+                    max_size = max(max_size, field.size_bits)
         
         # 恢复状态
         self.current_offset = saved_offset
         self.current_bit_offset = saved_bit_offset
         
+        result = (children, max_size)
+        self._layout_cache[key] = result
+        if key not in self._node_size_cache:
+            self._node_size_cache[key] = self._calculate_union_size_from_children(children)
+        return result
+    
+    def _calculate_union_size_from_children(self, children: List[FieldInfo]) -> int:
+        """由已布局的子成员计算联合体大小（按成员类型大小，位域按其存储类型）"""
+        return max((child.type_info.size_bits for child in children), default=0)
+    
+    def _calculate_struct_size(self, struct_node: Struct) -> int:
+        """计算结构体大小（只计算布局，不创建FieldInfo）"""
+        if not struct_node.decls:
+            return 0
+        
+        key = id(struct_node)
+        total_size = self._node_size_cache.get(key)
+        if total_size is not None:
+            return total_size
+        
+        offset = 0
+        bit_offset = 0
+        for decl in struct_node.decls:
+            if not decl.type:
+                continue
+            bitsize = getattr(decl, 'bitsize', None)
+            bit_width = self._get_constant_value(bitsize) if bitsize is not None else None
+            type_info, size_bits = self._analyze_declaration_type(decl, not decl.name)
+            _, _, _, offset, bit_offset = self._place_field(
+                type_info, size_bits, bit_width, offset, bit_offset)
+        
+        total_size = self._pad_struct_size(offset)
+        self._node_size_cache[key] = total_size
         return total_size
     
-    def _calculate_union_size(self, union_node: c_ast.Union) -> int:
+    def _pad_struct_size(self, size_bits: int) -> int:
+        """结构体对齐：将大小补齐到pack对齐"""
+        alignment = self.config.pack_alignment
+        mask = alignment - 1
+        if alignment and not alignment & mask:
+            # 2的幂对齐（常见情况），用位运算向上取整
+            return (size_bits + mask) & ~mask
+        if size_bits % alignment != 0:
+            size_bits = ((size_bits // alignment) + 1) * alignment
+        return size_bits
+    
+    def _calculate_union_size(self, union_node: Union) -> int:
         """计算联合体大小"""
         if not union_node.decls:
             return 0
         
+        key = id(union_node)
+        max_size = self._node_size_cache.get(key)
+        if max_size is not None:
+            return max_size
+        
         max_size = 0
         for decl in union_node.decls:
             if decl.type:
                 _, size = self._analyze_type(decl.type)
                 max_size = max(max_size, size)
         
+        self._node_size_cache[key] = max_size
         return max_size
     
-    def _get_struct_children(self, struct_node: c_ast.Struct) -> List[FieldInfo]:
+    def _get_struct_children(self, struct_node: Struct) -> List[FieldInfo]:
         """获取结构体子成员"""
         if not struct_node.decls:
             return []
         
-        # 保存当前状态
-        saved_offset = self.current_offset
-        saved_bit_offset = self.current_bit_offset
-        
-        self.current_offset = 0
-        self.current_bit_offset = 0
-        
-        children = []
-        for decl in struct_node.decls:
-            field = self._analyze_declaration(decl)
-            if field:
-                children.append(field)
-        
-        # 恢复状态
-        self.current_offset = saved_offset
-        self.current_bit_offset = saved_bit_offset
-        
-        return children
+        return self._layout_struct(struct_node)[0]
     
-    def _get_union_children(self, union_node: c_ast.Union) -> List[FieldInfo]:
+    def _get_union_children(self, union_node: Union) -> List[FieldInfo]:
         """获取联合体子成员"""
         if not union_node.decls:
             return []
         
-        children = []
-        for decl in union_node.decls:
-            # 保存当前状态
-            saved_offset = self.current_offset
-            saved_bit_offset = self.current_bit_offset
-            
-            self.current_offset = 0
-            self.current_bit_offset = 0
-            
-            field = self._analyze_declaration(decl)
-            if field:
-                children.append(field)
-            
-            # 恢复状态
-            self.current_offset = saved_offset
-            self.current_bit_offset = saved_bit_offset
-        
-        return children
+        return self._layout_union(union_node)[0]
     
     def _get_constant_value(self, const_node) -> int:
         """获取常量值"""
@@ -1105,15 +1402,8 @@ class PycparserYamlGenerator:
         # Handle constant literals
         if hasattr(const_node, 'value'):
             try:
-                value = const_node.value
-                # 处理不同进制
-                if value.startswith('0x') or value.startswith('0X'):
-                    return int(value, 16)
-                elif value.startswith('0') and len(value) > 1 and value.isdigit():
-                    return int(value, 8)
-                else:
-                    return int(value)
-            except ValueError:
+                return _parse_int_literal(const_node.value)
+            except (ValueError, AttributeError):
                 return 1
         
         # Handle identifier nodes (like P_RETRY_VALID_RECORD_CNT)
@@ -1141,12 +1431,7 @@ class PycparserYamlGenerator:
                             if value_str.startswith('(') and value_str.endswith(')'):
                                 value_str = value_str[1:-1]  # Remove parentheses
                             try:
-                                if value_str.startswith('0x') or value_str.startswith('0X'):
-                                    return int(value_str, 16)
-                                elif value_str.startswith('0') and len(value_str) > 1 and value_str.isdigit():
-                                    return int(value_str, 8)
-                                else:
-                                    return int(value_str)
+                                return _parse_int_literal(value_str)
                             except ValueError:
                                 pass
             return None
@@ -1156,8 +1441,11 @@ class PycparserYamlGenerator:
     def save_yaml(self, data: Dict[str, Any], filename: str) -> bool:
         """Save as YAML file"""
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                yaml.dump(data, f, default_flow_style=False, 
+            # Stream straight into a large write buffer instead of building the document as a string
+            import yaml
+            dumper = _get_yaml_dumper()
+            with open(filename, 'w', encoding='utf-8', buffering=1 << 20) as f:
+                yaml.dump(data, f, Dumper=dumper, default_flow_style=False, 
                          allow_unicode=True, indent=2, sort_keys=False)
             
             if self.config.verbose:
@@ -1178,13 +1466,15 @@ class PycparserYamlGenerator:
             print(f"总大小: {info['total_size_bits']} bits ({info['total_size_bytes']} 字节)")
             print(f"对齐: {info['pack_alignment']} bits")
             
-            # 统计成员
+            # 统计成员(显式栈遍历, 避免深层嵌套时超出递归深度)
             def count_members(field_data):
                 count = 0
-                if 'members' in field_data:
-                    count += len(field_data['members'])
-                    for member in field_data['members']:
-                        count += count_members(member)
+                stack = [field_data]
+                while stack:
+                    members = stack.pop().get('members')
+                    if members:
+                        count += len(members)
+                        stack.extend(members)
                 return count
             
             if 'struct_definition' in data:
@@ -1208,6 +1498,10 @@ def main():
     parser.add_argument('-o', '--output', help='Output YAML filename (optional)')
     parser.add_argument('-p', '--pack', type=int, default=1, help='Pack alignment in bytes (default 1)')
     parser.add_argument('-v', '--verbose', action='store_true', help='Verbose output')
+    parser.add_argument('--dump-preprocessed', action='store_true',
+                        help='Write preprocessed content to preprocessed_debug.h')
+    parser.add_argument('--no-ast-cache', action='store_true',
+                        help='Do not read or write the parsed AST cache ($XDG_CACHE_HOME/cstruct2yaml)')
     parser.add_argument('--no-bitfields', action='store_true', help='Exclude bitfield information')
     parser.add_argument('--no-offsets', action='store_true', help='Exclude offset information')
     parser.add_argument('--no-children', action='store_true', help='Exclude child members')
@@ -1218,6 +1512,8 @@ def main():
     config = ConfigOptions(
         pack_alignment=args.pack * 8,  # Convert to bits
         verbose=args.verbose,
+        dump_preprocessed=args.dump_preprocessed,
+        ast_cache=not args.no_ast_cache,
         include_bitfields=not args.no_bitfields,
         include_offsets=not args.no_offsets,
         include_children=not args.no_children
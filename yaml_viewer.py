@@ -10,6 +10,12 @@ import argparse
 import sys
 from typing import Dict, Any, List, Optional
 
+# Prefer the LibYAML-backed loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
 
 class YamlStructViewer:
     """YAML struct viewer"""
@@ -21,7 +27,7 @@ class YamlStructViewer:
         """Load YAML file"""
         try:
             with open(filename, 'r', encoding='utf-8') as f:
-                self.data = yaml.safe_load(f)
+                self.data = yaml.load(f, Loader=_YamlLoader)
             return True
         except Exception as e:
             print(f"Failed to load YAML file: {e}")